@@ -5,7 +5,9 @@ Wraps the OpenAI client to automatically track and report usage metrics.
 
 import os
 import json
+import atexit
 import time
+import inspect
 import requests
 from datetime import datetime
 from typing import Optional
@@ -22,6 +24,10 @@ TRACKER_ENDPOINT = os.environ.get(
 
 TRACKER_API_KEY = os.environ.get('TRACKER_API_KEY', '')
 
+# Usage events recorded during this run, sent together on exit so the bin
+# is read and rewritten once per run instead of once per API call
+_PENDING_USAGE = []
+
 # Pricing per 1M tokens (update as needed)
 PRICING = {
     'gpt-4': {'input': 30.0, 'output': 60.0},
@@ -67,11 +73,14 @@ def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     return round(input_cost + output_cost, 6)
 
 
-def send_usage_data(data: dict) -> bool:
-    """Send usage data to tracking endpoint."""
+def send_usage_data(data) -> bool:
+    """Send usage data (one event or a list of events) to tracking endpoint."""
+    entries = data if isinstance(data, list) else [data]
+    
     if not TRACKER_ENDPOINT or 'YOUR_BIN_ID' in TRACKER_ENDPOINT:
         # Not configured yet, just log locally
-        print(f"📊 [TRACKER] {json.dumps(data, indent=2)}")
+        for entry in entries:
+            print(f"📊 [TRACKER] {json.dumps(entry, indent=2)}")
         return False
     
     try:
@@ -108,7 +117,7 @@ def send_usage_data(data: dict) -> bool:
                 records = []
             
             # Step 2: Append new data
-            records.append(data)
+            records.extend(entries)
             
             # Step 3: PUT updated data back
             # JSONBin expects data wrapped in appropriate structure
@@ -122,7 +131,7 @@ def send_usage_data(data: dict) -> bool:
             )
             
             if put_response.status_code in [200, 201]:
-                print(f"✅ [TRACKER] Data sent successfully")
+                print(f"✅ [TRACKER] Data sent successfully ({len(entries)} events)")
                 return True
             else:
                 print(f"⚠️ [TRACKER] Failed to send (HTTP {put_response.status_code})")
@@ -145,7 +154,7 @@ def track_usage(
     agent_name: Optional[str] = None,
     metadata: Optional[dict] = None
 ):
-    """Track a single API usage event."""
+    """Track a single API usage event (queued and sent with the run's other events)."""
     
     # Detect agent name from environment if not provided
     if not agent_name:
@@ -184,12 +193,25 @@ def track_usage(
         }
     }
     
-    # Send to endpoint
-    send_usage_data(data)
+    # Queue for the endpoint (sent by flush_usage on exit)
+    _PENDING_USAGE.append(data)
     
     return data
 
 
+def flush_usage() -> bool:
+    """Send all queued usage events in a single update of the tracking bin."""
+    if not _PENDING_USAGE:
+        return True
+    
+    entries = _PENDING_USAGE[:]
+    del _PENDING_USAGE[:len(entries)]
+    return send_usage_data(entries)
+
+
+atexit.register(flush_usage)
+
+
 # ═══════════════════════════════════════════════════════════
 # OpenAI Client Wrapper
 # ═══════════════════════════════════════════════════════════
@@ -204,17 +226,16 @@ def track_openai(client):
         
         # Now all API calls are automatically tracked
         response = client.chat.completions.create(...)
+    
+    AsyncOpenAI clients are supported too; their calls are tracked once
+    the awaited response arrives. Streamed calls are tracked from the
+    final usage chunk (pass stream_options={'include_usage': True}).
     """
     
     original_create = client.chat.completions.create
     
-    def tracked_create(*args, **kwargs):
-        """Wrapped create method that tracks usage."""
-        
-        # Call original method
-        response = original_create(*args, **kwargs)
-        
-        # Extract usage info
+    def record_usage(response, kwargs):
+        """Track usage from a completed response."""
         if hasattr(response, 'usage') and response.usage:
             usage = response.usage
             model = kwargs.get('model', response.model)
@@ -230,7 +251,35 @@ def track_openai(client):
                     'max_tokens': kwargs.get('max_tokens'),
                 }
             )
+    
+    async def tracked_async_create(pending, kwargs):
+        """Await an AsyncOpenAI response, then track it."""
+        response = await pending
+        record_usage(response, kwargs)
+        return response
+    
+    def tracked_stream(stream, kwargs):
+        """Yield streamed chunks, tracking the usage chunk when it arrives."""
+        for chunk in stream:
+            record_usage(chunk, kwargs)
+            yield chunk
+    
+    def tracked_create(*args, **kwargs):
+        """Wrapped create method that tracks usage."""
+        
+        # Call original method
+        response = original_create(*args, **kwargs)
+        
+        # AsyncOpenAI clients return a coroutine - track once it resolves
+        if inspect.isawaitable(response):
+            return tracked_async_create(response, kwargs)
+        
+        # Streams only report usage in their final chunk, and only when
+        # requested with stream_options={'include_usage': True}
+        if kwargs.get('stream'):
+            return tracked_stream(response, kwargs)
         
+        record_usage(response, kwargs)
         return response
     
     # Replace the method
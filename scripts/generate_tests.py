@@ -1,6 +1,7 @@
 import os
 import glob
 import openai
+from concurrent.futures import ThreadPoolExecutor
 from auto_tracker import track_openai
 
 # 1. SETUP
@@ -34,13 +35,17 @@ if not code_files:
 print(f"Found: {code_files}")
 
 # 3. READ ALL CODE
-code_content = ""
-for f in code_files:
+def read_code(path):
     try:
-        with open(f, "r", encoding="utf-8") as file:
-            code_content += f"\n# FILE: {f}\n{file.read()}\n"
+        with open(path, "r", encoding="utf-8") as file:
+            return f"\n# FILE: {path}\n{file.read()}\n"
     except Exception as e:
-        print(f"⚠️ Could not read {f}: {e}")
+        print(f"⚠️ Could not read {path}: {e}")
+        return ""
+
+# Reads are independent I/O, so overlap them (map keeps file order)
+with ThreadPoolExecutor(max_workers=min(8, len(code_files))) as executor:
+    code_content = "".join(executor.map(read_code, code_files))
 
 if not code_content.strip():
     with open("test_ai_generated.py", "w") as f:
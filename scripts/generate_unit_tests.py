@@ -2,6 +2,7 @@ import os
 import glob
 import openai
 import re
+from concurrent.futures import ThreadPoolExecutor
 from auto_tracker import track_openai  # ← ADDED: Auto-tracking import
 
 # 1. SETUP
@@ -43,13 +44,17 @@ def test_placeholder():
     exit(0)
 
 # 4. READ ALL CODE
-full_code = ""
-for f in code_files:
+def read_code(path):
     try:
-        with open(f, "r", encoding="utf-8") as file:
-            full_code += f"\n# FILE: {f}\n{file.read()}\n"
+        with open(path, "r", encoding="utf-8") as file:
+            return f"\n# FILE: {path}\n{file.read()}\n"
     except Exception as e:
-        print(f"⚠️ Could not read {f}: {e}")
+        print(f"⚠️ Could not read {path}: {e}")
+        return ""
+
+# Reads are independent I/O, so overlap them (map keeps file order)
+with ThreadPoolExecutor(max_workers=min(8, len(code_files))) as executor:
+    full_code = "".join(executor.map(read_code, code_files))
 
 if not full_code.strip():
     print("⚠️ Files found but all empty - creating placeholder")
@@ -5,9 +5,13 @@ Determines if PR can be auto-approved or needs human review based on AI analysis
 """
 
 import os
+import io
 import sys
 import json
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, List, Any
 
 
@@ -31,6 +35,68 @@ HIGH_RISK_KEYWORDS = ['auth', 'password', 'secret', 'token', 'credential', 'key'
 TEST_KEYWORDS = ['test', 'unit', 'regression', 'quality']
 EXCLUDE_KEYWORDS = ['staging', 'deploy', 'release', 'production', 'prod']
 
+# Approval criteria, indexed by their bit position in the decision mask
+_CRITERIA_NAMES = ('small_change', 'low_risk_files', 'ai_review_passed', 'tests_passed', 'no_security_changes')
+_CRITERIA_TITLES = tuple(name.replace('_', ' ').title() for name in _CRITERIA_NAMES)
+_ALL_CRITERIA_MASK = (1 << len(_CRITERIA_NAMES)) - 1
+
+# Confidence indexed by number of failed criteria
+_CONFIDENCE_BY_FAILED = ('high', 'medium', 'medium', 'low', 'low', 'low')
+
+
+# ═══════════════════════════════════════════════════════════
+# Output Buffering
+# ═══════════════════════════════════════════════════════════
+
+class _Buffer:
+    """Collect log lines in memory and write them to stdout in one call."""
+    
+    def __init__(self):
+        self._buf = io.StringIO()
+    
+    def log(self, msg: str = ""):
+        """Append a line to the buffer (drop-in for print)."""
+        self._buf.write(f"{msg}\n")
+    
+    def flush(self):
+        """Write everything buffered so far to stdout."""
+        sys.stdout.write(self._buf.getvalue())
+        sys.stdout.flush()
+        self._buf.seek(0)
+        self._buf.truncate()
+
+
+_LOG = _Buffer()
+log = _LOG.log
+
+# Flush on any exit path, including sys.exit(1) on errors
+atexit.register(_LOG.flush)
+
+
+# ═══════════════════════════════════════════════════════════
+# HTTP Session
+# ═══════════════════════════════════════════════════════════
+
+# One pooled session for all GitHub and Slack calls, so requests reuse
+# TLS connections and transient 429/5xx responses are retried with backoff.
+# Only idempotent methods (urllib3's default) are retried: a POST that
+# failed with a 5xx may still have created its comment.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504]
+    )
+))
+_SESSION.headers.update({'Accept': 'application/vnd.github.v3+json'})
+
+# Auth is sent per GitHub request (not on the session) so the token never
+# leaks to the Slack webhook, which shares the same session.
+GITHUB_HEADERS = {'Authorization': f'token {GITHUB_TOKEN}'}
+
 
 # ═══════════════════════════════════════════════════════════
 # Helper Functions
@@ -54,45 +120,47 @@ def is_test_workflow(name: str) -> bool:
     
     return has_test_keyword and not has_exclude_keyword
 
+def get_all_pages(url: str) -> List[Dict[str, Any]]:
+    """GET a paginated GitHub list endpoint, following Link: rel="next"."""
+    items = []
+    url = f"{url}?per_page=100"
+    while url:
+        response = _SESSION.get(url, headers=GITHUB_HEADERS, timeout=10)
+        response.raise_for_status()
+        items.extend(response.json())
+        url = response.links.get('next', {}).get('url')
+    return items
+
+
 def get_pr_data() -> Dict[str, Any]:
     """Fetch PR data from GitHub API."""
     
-    print("📥 Fetching PR data from GitHub...")
+    log("📥 Fetching PR data from GitHub...")
     
     api_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/pulls/{PR_NUMBER}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
     
     try:
-        response = requests.get(api_url, headers=headers, timeout=10)
+        response = _SESSION.get(api_url, headers=GITHUB_HEADERS, timeout=10)
         response.raise_for_status()
         
         pr = response.json()
         
         # Get files changed
-        files_url = f"{api_url}/files"
-        files_response = requests.get(files_url, headers=headers, timeout=10)
-        files_response.raise_for_status()
-        files = files_response.json()
+        files = get_all_pages(f"{api_url}/files")
         
         # Get latest review comments
-        comments_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues/{PR_NUMBER}/comments"
-        comments_response = requests.get(comments_url, headers=headers, timeout=10)
-        comments_response.raise_for_status()
-        comments = comments_response.json()
+        comments = get_all_pages(f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues/{PR_NUMBER}/comments")
         
         # Find AI review comment
         ai_review = ""
         for comment in reversed(comments):  # Get latest first
-            if '🤖 AI Code Review' in comment.get('body', ''):
+            if (comment.get('body') or '').startswith('## 🤖 AI Code Review'):
                 ai_review = comment['body']
                 break
         
         # Get check runs (test status)
         checks_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/commits/{pr['head']['sha']}/check-runs"
-        checks_response = requests.get(checks_url, headers=headers, timeout=10)
+        checks_response = _SESSION.get(checks_url, headers=GITHUB_HEADERS, timeout=10)
         checks_response.raise_for_status()
         checks = checks_response.json()
         
@@ -107,7 +175,7 @@ def get_pr_data() -> Dict[str, Any]:
         }
         
     except Exception as e:
-        print(f"❌ Error fetching PR data: {e}")
+        log(f"❌ Error fetching PR data: {e}")
         sys.exit(1)
 
 
@@ -123,9 +191,9 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
         - recommended_labels: list
     """
     
-    print("\n" + "═" * 60)
-    print("🔍 EVALUATING PR FOR AUTO-APPROVAL")
-    print("═" * 60)
+    log("\n" + "═" * 60)
+    log("🔍 EVALUATING PR FOR AUTO-APPROVAL")
+    log("═" * 60)
     
     changed_files = pr_data["changed_files"]
     ai_review = pr_data["ai_review"]
@@ -135,7 +203,7 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
     # Criterion 1: Small change (≤3 files)
     # ─────────────────────────────────────────────────────────
     small_change = len(changed_files) <= MAX_FILES_FOR_AUTO_APPROVE
-    print(f"\n{'✅' if small_change else '❌'} Small change: {len(changed_files)} files (limit: {MAX_FILES_FOR_AUTO_APPROVE})")
+    log(f"\n{'✅' if small_change else '❌'} Small change: {len(changed_files)} files (limit: {MAX_FILES_FOR_AUTO_APPROVE})")
     
     # ─────────────────────────────────────────────────────────
     # Criterion 2: Low-risk files only
@@ -154,10 +222,10 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
     
     if not low_risk_files:
         risky_files = [f for f in changed_files if not is_low_risk_file(f)]
-        print(f"❌ Low-risk files: NO")
-        print(f"   Risky files: {risky_files[:3]}")  # Show first 3
+        log(f"❌ Low-risk files: NO")
+        log(f"   Risky files: {risky_files[:3]}")  # Show first 3
     else:
-        print(f"✅ Low-risk files: YES (all {len(changed_files)} files are docs/tests/config)")
+        log(f"✅ Low-risk files: YES (all {len(changed_files)} files are docs/tests/config)")
     
     # ─────────────────────────────────────────────────────────
     # Criterion 3: AI review passed
@@ -171,11 +239,11 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
         
         ai_review_passed = has_approval and not has_critical
         
-        print(f"{'✅' if ai_review_passed else '❌'} AI review passed: {ai_review_passed}")
+        log(f"{'✅' if ai_review_passed else '❌'} AI review passed: {ai_review_passed}")
         if has_critical:
-            print(f"   ⚠️  Critical issues found in AI review")
+            log(f"   ⚠️  Critical issues found in AI review")
     else:
-        print(f"❌ AI review passed: NO (no AI review found)")
+        log(f"❌ AI review passed: NO (no AI review found)")
     
     # ─────────────────────────────────────────────────────────
     # Criterion 4: Tests passed (excludes staging/deployment)
@@ -189,20 +257,20 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
             tests_passed = all(c['conclusion'] == 'success' for c in test_checks)
             failed_tests = [c['name'] for c in test_checks if c['conclusion'] != 'success']
             
-            print(f"{'✅' if tests_passed else '❌'} Tests passed: {len(test_checks)} checks")
+            log(f"{'✅' if tests_passed else '❌'} Tests passed: {len(test_checks)} checks")
             if failed_tests:
-                print(f"   ⚠️  Failed: {failed_tests}")
+                log(f"   ⚠️  Failed: {failed_tests}")
             
             # Debug: Show what was excluded
             excluded = [c['name'] for c in checks if not is_test_workflow(c['name'])]
             if excluded:
-                print(f"   ℹ️  Excluded (not tests): {excluded[:3]}")
+                log(f"   ℹ️  Excluded (not tests): {excluded[:3]}")
         else:
             # No test checks found - assume OK for docs/config changes
             tests_passed = low_risk_files
-            print(f"{'✅' if tests_passed else '⚠️ '} Tests passed: N/A (no test checks found)")
+            log(f"{'✅' if tests_passed else '⚠️ '} Tests passed: N/A (no test checks found)")
     else:
-        print(f"⚠️  Tests passed: Unknown (no checks data)")
+        log(f"⚠️  Tests passed: Unknown (no checks data)")
         tests_passed = False
     
     # ─────────────────────────────────────────────────────────
@@ -217,10 +285,10 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
     
     if not no_security_changes:
         security_files = [f for f in changed_files if has_security_keywords(f)]
-        print(f"❌ No security changes: NO")
-        print(f"   Security-sensitive files: {security_files}")
+        log(f"❌ No security changes: NO")
+        log(f"   Security-sensitive files: {security_files}")
     else:
-        print(f"✅ No security changes: YES")
+        log(f"✅ No security changes: YES")
     
     # ─────────────────────────────────────────────────────────
     # Additional checks
@@ -229,12 +297,21 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
     # Check change size
     total_changes = pr_data["additions"] + pr_data["deletions"]
     small_diff = total_changes <= 100
-    print(f"\n{'✅' if small_diff else '⚠️ '} Change size: +{pr_data['additions']} -{pr_data['deletions']} (total: {total_changes})")
+    log(f"\n{'✅' if small_diff else '⚠️ '} Change size: +{pr_data['additions']} -{pr_data['deletions']} (total: {total_changes})")
     
     # ─────────────────────────────────────────────────────────
     # Make decision
     # ─────────────────────────────────────────────────────────
     
+    # Pack the five criteria into one bitmask (bit i = _CRITERIA_NAMES[i])
+    mask = (
+        small_change
+        | low_risk_files << 1
+        | ai_review_passed << 2
+        | tests_passed << 3
+        | no_security_changes << 4
+    )
+    
     criteria = {
         "small_change": small_change,
         "low_risk_files": low_risk_files,
@@ -243,11 +320,12 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
         "no_security_changes": no_security_changes
     }
     
-    all_passed = all(criteria.values())
+    all_passed = mask == _ALL_CRITERIA_MASK
+    confidence = _CONFIDENCE_BY_FAILED[len(_CRITERIA_NAMES) - mask.bit_count()]
     
-    print("\n" + "─" * 60)
-    print(f"Overall: {'✅ ALL CRITERIA MET' if all_passed else '❌ SOME CRITERIA FAILED'}")
-    print("─" * 60)
+    log("\n" + "─" * 60)
+    log(f"Overall: {'✅ ALL CRITERIA MET' if all_passed else '❌ SOME CRITERIA FAILED'}")
+    log("─" * 60)
     
     if all_passed:
         return {
@@ -255,54 +333,50 @@ def check_if_auto_approvable(pr_data: Dict[str, Any]) -> Dict[str, Any]:
             "reason": "✅ Low-risk change with all quality checks passed",
             "criteria_results": criteria,
             "recommended_labels": ["auto-approved", "ready-to-merge"],
-            "confidence": "high"
-        }
-    else:
-        failed = [k.replace('_', ' ').title() for k, v in criteria.items() if not v]
-        
-        # Determine reviewer based on what failed
-        assign_to = "tech-lead"
-        if not criteria["no_security_changes"]:
-            assign_to = "security-team"
-        elif not criteria["tests_passed"]:
-            assign_to = "qa-team"
-        
-        return {
-            "auto_approve": False,
-            "reason": f"❌ Needs human review - Failed: {', '.join(failed)}",
-            "criteria_results": criteria,
-            "assign_to": assign_to,
-            "recommended_labels": ["needs-review"],
-            "confidence": "low" if len(failed) >= 3 else "medium"
+            "confidence": confidence
         }
+    
+    failed = [title for i, title in enumerate(_CRITERIA_TITLES) if not mask >> i & 1]
+    
+    # Determine reviewer based on what failed (security outranks tests)
+    assign_to = (
+        "security-team" if not mask >> 4 & 1
+        else "qa-team" if not mask >> 3 & 1
+        else "tech-lead"
+    )
+    
+    return {
+        "auto_approve": False,
+        "reason": f"❌ Needs human review - Failed: {', '.join(failed)}",
+        "criteria_results": criteria,
+        "assign_to": assign_to,
+        "recommended_labels": ["needs-review"],
+        "confidence": confidence
+    }
 
 
 def add_pr_label(label: str):
     """Add label to PR."""
     
     api_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues/{PR_NUMBER}/labels"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
     
     try:
-        response = requests.post(
+        response = _SESSION.post(
             api_url,
-            headers=headers,
+            headers=GITHUB_HEADERS,
             json={"labels": [label]},
             timeout=10
         )
         response.raise_for_status()
-        print(f"   ✅ Added label: {label}")
+        log(f"   ✅ Added label: {label}")
     except Exception as e:
-        print(f"   ⚠️  Could not add label '{label}': {e}")
+        log(f"   ⚠️  Could not add label '{label}': {e}")
 
 
 def post_decision_comment(decision: Dict[str, Any], pr_data: Dict[str, Any]):
     """Post approval decision as PR comment."""
     
-    print("\n📝 Posting decision to PR...")
+    log("\n📝 Posting decision to PR...")
     
     criteria_emoji = {
         "small_change": "📝",
@@ -382,32 +456,28 @@ This PR meets all criteria for auto-approval. A team lead can merge when ready.
     
     # Post to GitHub
     api_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}/issues/{PR_NUMBER}/comments"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
     
     try:
-        response = requests.post(
+        response = _SESSION.post(
             api_url,
-            headers=headers,
+            headers=GITHUB_HEADERS,
             json={"body": comment},
             timeout=10
         )
         response.raise_for_status()
-        print("✅ Decision posted to PR")
+        log("✅ Decision posted to PR")
     except Exception as e:
-        print(f"⚠️  Could not post comment: {e}")
+        log(f"⚠️  Could not post comment: {e}")
 
 
 def send_slack_notification(decision: Dict[str, Any], pr_data: Dict[str, Any]):
     """Send Slack notification about approval decision."""
     
     if not SLACK_WEBHOOK:
-        print("ℹ️  No SLACK_WEBHOOK configured, skipping Slack notification")
+        log("ℹ️  No SLACK_WEBHOOK configured, skipping Slack notification")
         return
     
-    print("\n📨 Sending Slack notification...")
+    log("\n📨 Sending Slack notification...")
     
     pr_title = pr_data["pr"]["title"]
     pr_url = pr_data["pr"]["html_url"]
@@ -497,11 +567,11 @@ def send_slack_notification(decision: Dict[str, Any], pr_data: Dict[str, Any]):
         }
     
     try:
-        response = requests.post(SLACK_WEBHOOK, json=message, timeout=10)
+        response = _SESSION.post(SLACK_WEBHOOK, json=message, timeout=10)
         response.raise_for_status()
-        print("✅ Slack notification sent")
+        log("✅ Slack notification sent")
     except Exception as e:
-        print(f"⚠️  Could not send Slack notification: {e}")
+        log(f"⚠️  Could not send Slack notification: {e}")
 
 
 # ═══════════════════════════════════════════════════════════
@@ -511,23 +581,23 @@ def send_slack_notification(decision: Dict[str, Any], pr_data: Dict[str, Any]):
 def main():
     """Main execution."""
     
-    print("\n" + "═" * 60)
-    print("🤖 PR APPROVAL CHECKER")
-    print("═" * 60)
+    log("\n" + "═" * 60)
+    log("🤖 PR APPROVAL CHECKER")
+    log("═" * 60)
     
     # Validate environment
     if not all([GITHUB_TOKEN, REPO_OWNER, REPO_NAME, PR_NUMBER]):
-        print("❌ Missing required environment variables:")
-        print(f"   GITHUB_TOKEN: {'✓' if GITHUB_TOKEN else '✗'}")
-        print(f"   REPO_OWNER: {'✓' if REPO_OWNER else '✗'}")
-        print(f"   REPO_NAME: {'✓' if REPO_NAME else '✗'}")
-        print(f"   PR_NUMBER: {'✓' if PR_NUMBER else '✗'}")
+        log("❌ Missing required environment variables:")
+        log(f"   GITHUB_TOKEN: {'✓' if GITHUB_TOKEN else '✗'}")
+        log(f"   REPO_OWNER: {'✓' if REPO_OWNER else '✗'}")
+        log(f"   REPO_NAME: {'✓' if REPO_NAME else '✗'}")
+        log(f"   PR_NUMBER: {'✓' if PR_NUMBER else '✗'}")
         sys.exit(1)
     
-    print(f"\n📋 Configuration:")
-    print(f"   Repository: {REPO_OWNER}/{REPO_NAME}")
-    print(f"   PR Number: #{PR_NUMBER}")
-    print(f"   Slack: {'Enabled' if SLACK_WEBHOOK else 'Disabled'}")
+    log(f"\n📋 Configuration:")
+    log(f"   Repository: {REPO_OWNER}/{REPO_NAME}")
+    log(f"   PR Number: #{PR_NUMBER}")
+    log(f"   Slack: {'Enabled' if SLACK_WEBHOOK else 'Disabled'}")
     
     # Get PR data
     pr_data = get_pr_data()
@@ -536,7 +606,7 @@ def main():
     decision = check_if_auto_approvable(pr_data)
     
     # Add labels
-    print(f"\n🏷️  Adding labels...")
+    log(f"\n🏷️  Adding labels...")
     for label in decision["recommended_labels"]:
         add_pr_label(label)
     
@@ -547,9 +617,9 @@ def main():
     send_slack_notification(decision, pr_data)
     
     # Output for GitHub Actions
-    print(f"\n📤 Setting output variables:")
-    print(f"   auto_approve={str(decision['auto_approve']).lower()}")
-    print(f"   confidence={decision['confidence']}")
+    log(f"\n📤 Setting output variables:")
+    log(f"   auto_approve={str(decision['auto_approve']).lower()}")
+    log(f"   confidence={decision['confidence']}")
     
     # Set GitHub Actions output
     if os.getenv('GITHUB_OUTPUT'):
@@ -558,6 +628,9 @@ def main():
             f.write(f"confidence={decision['confidence']}\n")
             f.write(f"reason={decision['reason']}\n")
     
+    # Flush the run log, then print the final decision unbuffered
+    _LOG.flush()
+    
     print("\n" + "═" * 60)
     if decision["auto_approve"]:
         print("✅ PR CAN BE AUTO-APPROVED")
@@ -4,13 +4,43 @@ AI PR Review Agent
 Reviews the actual code files in a pull request and provides feedback.
 """
 
+import io
 import os
 import sys
-import git
 import re
+import json
+import time
+import hashlib
+import asyncio
+import tempfile
+import tokenize
+import subprocess
+from contextlib import contextmanager
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import requests
-from openai import OpenAI
-from auto_tracker import track_openai  # ← Auto-tracking import
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError
+from auto_tracker import track_openai, track_usage  # ← Auto-tracking import
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts fall back to a chars/4 estimate
+    tiktoken = None
+
+try:
+    import orjson
+    json_loads = orjson.loads  # Parses bytes directly, several times faster
+except ImportError:  # Optional: stdlib json is used instead
+    json_loads = json.loads
+
+try:
+    import h2  # noqa: F401 - only needed for httpx HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:  # Optional: OpenAI requests fall back to HTTP/1.1
+    HTTP2_AVAILABLE = False
 
 # ═══════════════════════════════════════════════════════════
 # Configuration
@@ -24,13 +54,168 @@ REPO_NAME = os.environ.get('REPO_NAME')
 BASE_REF = os.environ.get('BASE_REF')
 GITHUB_RUN_URL = os.environ.get('GITHUB_RUN_URL')
 SLACK_WEBHOOK = os.environ.get('SLACK_WEBHOOK')
+USE_BATCH_API = os.environ.get('USE_BATCH_API') == '1'  # Non-blocking runs (nightly, large PRs)
+STREAM_REVIEW = os.environ.get('STREAM_REVIEW') == '1'  # Show partial review in the PR comment
+FORCE_REVIEW = os.environ.get('FORCE_REVIEW') == '1'    # Fresh AI review, ignoring skip checks and caches
+REVIEW_PER_FILE = os.environ.get('REVIEW_PER_FILE') == '1'  # One concurrent request per file
+COMPRESS_CODE = os.environ.get('COMPRESS_CODE') == '1'  # Strip Python comments to save prompt tokens
+REVIEW_DIFF = os.environ.get('REVIEW_DIFF') == '1'      # Send function-context diffs, not whole files
 
 # Review settings
-MAX_FILE_SIZE = 5000  # Max characters per file to review
+MAX_FILE_SIZE = 5000  # Max characters per file when tiktoken is unavailable
+MAX_FILE_BYTES = 1_000_000  # Larger files are generated/vendored and skipped
+CHARS_PER_TOKEN_CAP = 8     # Chars read per budgeted token (tokens are rarely longer)
 MAX_FILES = 10        # Max number of files to review
+# Never worth an AI review (extensions matched case-insensitively)
+DOC_EXTENSIONS = frozenset({'.md', '.lock', '.yaml', '.yml', '.txt', '.svg', '.png'})
+DOC_FILENAMES = frozenset({'package-lock.json', 'go.sum'})  # Lockfiles without a .lock extension
+CODE_EXTENSIONS = frozenset({  # Files worth reviewing (matched case-insensitively)
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.go', '.rb', '.php', '.c', '.cpp', '.h', '.cs'
+})
+INDENT_SENSITIVE_EXTENSIONS = frozenset({'.py'})  # Re-indenting changes what the code does
 AI_MODEL = 'gpt-4o-mini'
 AI_TEMPERATURE = 0.3
-AI_MAX_TOKENS = 1500
+PROMPT_VERSION = 'v3'        # Bump whenever the review prompt changes
+MAX_PROMPT_TOKENS = 100_000  # Max code tokens per review request
+MAX_BATCH_FILES = 8          # Max files per review request
+AI_MIN_TOKENS = 800          # Output floor: a JSON-escaped single-file review must fit
+AI_TOKENS_PER_FILE = 400     # Output tokens allowed per reviewed file
+# Retry ceiling for a cut-off reply: twice the allowance of a full batch, so
+# every batch size gets a retry with more room than its first cap
+AI_MAX_TOKENS = 2 * AI_TOKENS_PER_FILE * MAX_BATCH_FILES
+PROMPT_TOKEN_BUDGET = 60_000 # Total prompt tokens shared by all reviewed files
+AI_CONCURRENCY = 5           # Max concurrent requests when a review is split
+AI_MAX_ATTEMPTS = 3          # Attempts per split request on rate limit/timeout
+
+STREAM_UPDATE_EVERY = 50      # Streamed chunks between partial comment updates
+
+# Batch API settings (USE_BATCH_API=1)
+BATCH_POLL_INTERVAL = 30       # Seconds before the first status check
+BATCH_POLL_MAX_INTERVAL = 300  # Backoff ceiling between status checks
+
+# Appended to every review prompt so per-file results can be parsed
+JSON_RESPONSE_INSTRUCTIONS = (
+    'Return a JSON object mapping each reviewed file path to its markdown '
+    'review, e.g. {"<path>": "<markdown review>"}.'
+)
+
+# Static review instructions, sent first as the system message so every
+# request shares a byte-identical prefix (eligible for OpenAI prompt caching)
+REVIEW_INSTRUCTIONS = f"""You are a senior software engineer with 10 years experience reviewing Python code for production systems. Review these code files and provide constructive feedback.
+
+Focus on:
+1. 🐛 **Bugs & Logic Errors**: Null checks, edge cases, potential crashes
+2. 🔒 **Security Issues**: SQL injection, XSS, authentication, exposed secrets
+3. ⚡ **Performance**: Inefficient code, memory leaks, slow operations
+4. 📖 **Code Quality**: Readability, naming, complexity, best practices
+5. 🧪 **Testing Needs**: What should be tested, missing test cases
+6. 📚 **Documentation**: Unclear code, missing comments
+
+Format your response:
+- Start with overall assessment (✅ Looks good / ⚠️ Needs attention / 🔴 Critical issues)
+- Group findings by severity:
+  - 🔴 **Critical**: Must fix immediately (security, major bugs)
+  - 🟡 **Important**: Should fix (performance, quality issues)
+  - 🟢 **Suggestions**: Nice to have (style, minor improvements)
+- For each issue:
+  - Mention the file name
+  - Point out the specific problem
+  - Explain WHY it's an issue
+  - Suggest HOW to fix it with code example if helpful
+- End with positive feedback on what's done well
+- Be helpful and constructive, not just critical
+
+{JSON_RESPONSE_INSTRUCTIONS}"""
+REVIEW_INSTRUCTIONS_HASH = hashlib.sha256(REVIEW_INSTRUCTIONS.encode()).hexdigest()[:12]  # Logged to correlate cache hits
+
+# Review cache (restored/saved by actions/cache in the workflow)
+REVIEW_CACHE_DIR = '.github/ai-review-cache'
+REVIEW_CACHE_MAX_AGE_DAYS = 30
+LLM_CACHE_TTL = 7 * 24 * 3600  # Seconds a per-file review is reused for unchanged content
+REVIEW_FAILED_PREFIX = "⚠️ AI review failed"
+REVIEW_COMMENT_HEADER = "## 🤖 AI Code Review"  # Every review comment starts with this
+PROGRESS_COMMENT_HEADER = "## ⏳ AI Code Review in progress..."  # Streaming preview, deleted when done
+
+# Hidden marker in the review comment recording which HEAD it reviewed
+REVIEWED_SHA_MARKER = "<!-- ai-review-sha: {} -->"
+REVIEWED_SHA_RE = re.compile(r'<!-- ai-review-sha: ([0-9a-f]{40}) -->')
+
+# HTTP settings
+HTTP_TIMEOUT = 10    # Seconds per GitHub request
+SLACK_TIMEOUT = 5    # Seconds for the Slack webhook (best-effort notification)
+SLACK_PREVIEW_CHARS = 500  # Review chars included in the Slack message
+OPENAI_TIMEOUT = 60  # Seconds per OpenAI request
+
+def _load_encoding():
+    """Tokenizer for AI_MODEL, or None if tiktoken or its BPE data is unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(AI_MODEL)
+    except Exception as e:
+        print(f"⚠️  tiktoken encoding unavailable ({type(e).__name__}), using character limits")
+        return None
+
+
+# Tokenizer for AI_MODEL (None means char limits/estimates are used instead)
+_ENC = _load_encoding()
+
+# ═══════════════════════════════════════════════════════════
+# HTTP Session
+# ═══════════════════════════════════════════════════════════
+
+# One pooled session for all GitHub and Slack calls, so requests reuse
+# TLS connections and transient 429/5xx responses are retried with backoff.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "PATCH"]  # Not POST: a failed create may still have posted
+    )
+))
+_SESSION.headers.update({'Accept': 'application/vnd.github.v3+json'})
+
+# Auth is sent per GitHub request (not on the session) so the token never
+# leaks to the Slack webhook, which shares the same session.
+GITHUB_HEADERS = {'Authorization': f'token {GITHUB_TOKEN}'}
+GITHUB_API_URL = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}"
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# The PR's newest 100 comments in one request (REST lists oldest first, 30 per page)
+FIND_REVIEW_COMMENT_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $before: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      comments(last: 100, before: $before) {
+        nodes { databaseId body }
+        pageInfo { hasPreviousPage startCursor }
+      }
+    }
+  }
+}
+"""
+
+# ═══════════════════════════════════════════════════════════
+# Shared Clients
+# ═══════════════════════════════════════════════════════════
+
+# Created on first use and reused, so OpenAI calls share one connection
+# pool (one multiplexed HTTP/2 connection when h2 is installed).
+_OAI = None
+OPENAI_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+
+
+def get_openai_client():
+    """Return the tracked OpenAI client, created once."""
+    global _OAI
+    if _OAI is None:
+        http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=OPENAI_LIMITS, timeout=OPENAI_TIMEOUT)
+        _OAI = track_openai(OpenAI(api_key=OPENAI_KEY, http_client=http_client))
+    return _OAI
 
 # ═══════════════════════════════════════════════════════════
 # Functions
@@ -43,56 +228,260 @@ def print_step(step_num, title):
     print("━" * 60)
 
 
+def _git(*args):
+    """Run a git command in the current directory and return its stdout."""
+    return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout
+
+
 def get_changed_files():
-    """Get list of files that changed in this PR."""
+    """
+    Get the files that changed in this PR.
+    
+    Returns dict with:
+        - changed_files: list of code file paths (at most MAX_FILES)
+        - base_sha: base commit SHA (None if git lookup failed)
+        - head_sha: head commit SHA (None if git lookup failed)
+        - additions/deletions: changed line counts across the whole diff
+        - docs_only: True if every changed file is documentation/lockfile/asset
+        - whitespace_only: True if the code files only changed whitespace
+          (otherwise whitespace-only files are left out of changed_files)
+    """
     print_step(1, "Finding Changed Files")
     
+    result = {
+        "changed_files": [], "base_sha": None, "head_sha": None,
+        "additions": 0, "deletions": 0, "docs_only": False, "whitespace_only": False
+    }
+    
     try:
-        repo = git.Repo('.')
-        
-        # Get files changed compared to base branch
-        repo.remotes.origin.fetch(BASE_REF)
-        base_commit = repo.commit(f'origin/{BASE_REF}')
-        head_commit = repo.commit('HEAD')
+        # In a shallow CI checkout fetch only the base tip (no history, blobs
+        # fetched lazily on diff). A full clone gets a plain fetch, so a dev
+        # checkout is never turned shallow or partial.
+        shallow = _git('rev-parse', '--is-shallow-repository').strip() == 'true'
+        try:
+            _git('fetch', *(['--depth=1', '--filter=blob:none'] if shallow else []), 'origin', BASE_REF)
+            base_sha = _git('rev-parse', 'FETCH_HEAD').strip()
+        except subprocess.CalledProcessError as e:
+            if not shallow:
+                raise
+            print(f"⚠️  Shallow fetch failed ({e.stderr.strip() or e}), falling back to full fetch")
+            _git('fetch', 'origin', BASE_REF)
+            base_sha = _git('rev-parse', f'origin/{BASE_REF}').strip()
+        head_sha = _git('rev-parse', 'HEAD').strip()
+        result["base_sha"] = base_sha
+        result["head_sha"] = head_sha
         
-        # Get list of changed files
+        # One diff gives the file list, each file's status and the line stats.
+        # With -z, raw records are ":<modes> <shas> <status>" followed by the
+        # path; numstat records are "added<TAB>deleted<TAB>path" ("-" for binaries).
         changed_files = []
-        diffs = base_commit.diff(head_commit)
+        all_paths = []
+        records = iter(_git('diff', '--raw', '--numstat', '-z', '--no-renames', base_sha, head_sha).split('\0'))
         
-        for diff in diffs:
-            # Get the file path (use b_path for new/modified files)
-            file_path = diff.b_path if diff.b_path else diff.a_path
-            
-            # Only include files that exist and are code files
-            if file_path and os.path.exists(file_path):
-                # Skip non-code files
-                if file_path.endswith(('.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.go', '.rb', '.php', '.c', '.cpp', '.h', '.cs')):
+        for record in records:
+            if record.startswith(':'):
+                file_path = next(records)
+                all_paths.append(file_path)
+                
+                # Only include code files that still exist (deleted files have no content)
+                if record[-1] != 'D' and os.path.splitext(file_path)[1].lower() in CODE_EXTENSIONS:
                     changed_files.append(file_path)
+            elif record:
+                added, deleted, _ = record.split('\t', 2)
+                if added != '-':
+                    result["additions"] += int(added)
+                    result["deletions"] += int(deleted)
+        
+        print(f"📊 Diff: +{result['additions']} -{result['deletions']} across {len(all_paths)} files")
+        
+        result["docs_only"] = bool(all_paths) and all(
+            os.path.basename(path) in DOC_FILENAMES or os.path.splitext(path)[1].lower() in DOC_EXTENSIONS
+            for path in all_paths
+        )
         
         if not changed_files:
             print("⚠️  No code files changed")
-            return []
+            return result
+        
+        # Code files whose diff vanishes when whitespace is ignored need no
+        # review (numstat omits them under -w, unlike --name-only). Where
+        # indentation is syntax, only trailing spaces and blank lines count.
+        indent_sensitive = [
+            path for path in changed_files
+            if os.path.splitext(path)[1].lower() in INDENT_SENSITIVE_EXTENSIONS
+        ]
+        other = [path for path in changed_files if path not in indent_sensitive]
+        meaningful = set()
+        for paths, space_flag in ((other, '--ignore-all-space'), (indent_sensitive, '--ignore-space-at-eol')):
+            if not paths:
+                continue
+            meaningful.update(
+                record.split('\t', 2)[2]
+                for record in _git(
+                    'diff', '--numstat', '-z', '--no-renames', space_flag, '--ignore-blank-lines',
+                    base_sha, head_sha, '--', *paths
+                ).split('\0') if record
+            )
+        reformatted = [path for path in changed_files if path not in meaningful]
+        if reformatted:
+            print(f"ℹ️  Skipping {len(reformatted)} whitespace-only files: {', '.join(reformatted)}")
+            changed_files = [path for path in changed_files if path in meaningful]
+        result["whitespace_only"] = not changed_files
+        if not changed_files:
+            return result
         
         print(f"✅ Found {len(changed_files)} changed code files:")
         for f in changed_files:
             print(f"   📄 {f}")
         
-        return changed_files[:MAX_FILES]  # Limit number of files
+        result["changed_files"] = changed_files[:MAX_FILES]  # Limit number of files
+        return result
         
     except Exception as e:
         print(f"❌ Error getting changed files: {e}")
-        return []
+        return result
+
+
+def review_cache_key(base_sha, head_sha):
+    """Cache key for a review of head_sha against base_sha with the current prompt/model."""
+    mode = "|diff" if REVIEW_DIFF else ""
+    return hashlib.sha256(
+        f"{base_sha}|{head_sha}|{PROMPT_VERSION}|{AI_MODEL}{mode}".encode()
+    ).hexdigest()
+
+
+def load_cached_review(cache_key):
+    """
+    Return a cached review for cache_key, or None on a miss.
+    
+    Entries older than REVIEW_CACHE_MAX_AGE_DAYS are deleted while scanning.
+    """
+    if not os.path.isdir(REVIEW_CACHE_DIR):
+        return None
+    
+    cutoff = time.time() - REVIEW_CACHE_MAX_AGE_DAYS * 86400
+    for entry in os.scandir(REVIEW_CACHE_DIR):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+    
+    cache_path = os.path.join(REVIEW_CACHE_DIR, f"{cache_key}.md")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def save_cached_review(cache_key, review_text):
+    """Store a review so re-runs on the same commits skip the AI call."""
+    try:
+        os.makedirs(REVIEW_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(REVIEW_CACHE_DIR, f"{cache_key}.md"), 'w', encoding='utf-8') as f:
+            f.write(review_text)
+    except OSError as e:
+        print(f"⚠️  Could not cache review: {e}")
+
+
+def file_review_cache_key(file_path, content):
+    """Cache key for one file's review: model/prompt settings, path and content."""
+    return hashlib.sha256("\0".join([
+        AI_MODEL, PROMPT_VERSION, REVIEW_INSTRUCTIONS_HASH, str(AI_TEMPERATURE), str(AI_MAX_TOKENS),
+        file_path, content
+    ]).encode()).hexdigest()
 
 
-def read_file_content(file_path):
-    """Read and return file content."""
+def load_cached_response(cache_key):
+    """Return the review cached for cache_key within LLM_CACHE_TTL, or None."""
+    cache_path = os.path.join(REVIEW_CACHE_DIR, f"llm-{cache_key}.md")
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        if time.time() - os.path.getmtime(cache_path) > LLM_CACHE_TTL:
+            return None
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_cached_response(cache_key, review_text):
+    """Store a review under cache_key (written atomically for concurrent runs)."""
+    cache_path = os.path.join(REVIEW_CACHE_DIR, f"llm-{cache_key}.md")
+    try:
+        os.makedirs(REVIEW_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(review_text)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️  Could not cache AI response: {e}")
+
+
+def strip_python_comments(source):
+    """
+    Drop # comments and collapse runs of blank lines in Python source.
+    
+    Blank lines inside multi-line strings and docstrings are part of the
+    string's value and are left alone. Returns the source unchanged if it
+    does not tokenize (e.g. it was cut off mid-string by the read limit).
+    """
+    comments, string_rows = [], set()
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            if token.type == tokenize.COMMENT:
+                comments.append(token.start)
+            elif token.end[0] > token.start[0]:
+                string_rows.update(range(token.start[0] + 1, token.end[0] + 1))
+    except (tokenize.TokenError, SyntaxError):
+        return source
+    
+    lines = source.split('\n')
+    for row, col in comments:
+        lines[row - 1] = lines[row - 1][:col].rstrip()
+    
+    kept = []
+    previous_blank = False
+    for row, line in enumerate(lines, 1):
+        blank = not line.strip() and row not in string_rows
+        if blank and (previous_blank or not kept):
+            continue
+        kept.append(line)
+        previous_blank = blank
+    return '\n'.join(kept)
+
+
+def read_file_content(file_path, token_budget=None):
+    """
+    Read and return file content.
+    
+    Content is truncated to token_budget tokens when tiktoken is available,
+    otherwise to MAX_FILE_SIZE characters. Only the prefix that can survive
+    truncation is read, and files over MAX_FILE_BYTES are skipped.
+    """
+    try:
+        use_tokens = _ENC is not None and token_budget
+        read_limit = token_budget * CHARS_PER_TOKEN_CAP if use_tokens else MAX_FILE_SIZE
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            # fstat on the open file - no separate path lookup before opening
+            file_size = os.fstat(f.fileno()).st_size
+            if file_size > MAX_FILE_BYTES:
+                print(f"⏭️  Skipping {file_path} ({file_size} bytes, likely generated)")
+                return None
+            content = f.read(read_limit + 1)
+        truncated = len(content) > read_limit
+        
+        # Opt-in only: comments can matter to a review, and line numbers shift
+        if COMPRESS_CODE and file_path.endswith('.py'):
+            content = strip_python_comments(content)
         
         # Truncate if too large
-        if len(content) > MAX_FILE_SIZE:
-            content = content[:MAX_FILE_SIZE] + f"\n\n... (truncated - file is {len(content)} chars)"
+        if use_tokens:
+            tokens = _ENC.encode(content, disallowed_special=())
+            if len(tokens) > token_budget:
+                content = _ENC.decode(tokens[:token_budget])
+                truncated = True
+        content = content[:read_limit]
+        
+        if truncated:
+            content += f"\n\n... (truncated - file is {file_size} bytes)"
         
         return content
     except Exception as e:
@@ -100,62 +489,422 @@ def read_file_content(file_path):
         return None
 
 
+def read_file_diff(file_path, base_sha, head_sha, token_budget=None):
+    """
+    Return the file's diff against base_sha with whole-function context.
+    
+    Used instead of read_file_content with REVIEW_DIFF=1. Truncated to
+    token_budget tokens (MAX_FILE_SIZE characters without tiktoken).
+    """
+    try:
+        diff = _git('diff', '--function-context', '--no-renames', base_sha, head_sha, '--', file_path)
+    except Exception as e:
+        print(f"⚠️  Could not diff {file_path}: {e}")
+        return None
+    
+    if _ENC is not None and token_budget:
+        tokens = _ENC.encode(diff, disallowed_special=())
+        if len(tokens) > token_budget:
+            return _ENC.decode(tokens[:token_budget]) + f"\n\n... (truncated - diff is {len(tokens)} tokens)"
+    elif len(diff) > MAX_FILE_SIZE:
+        return diff[:MAX_FILE_SIZE] + f"\n\n... (truncated - diff is {len(diff)} characters)"
+    
+    return diff
+
+
+def count_tokens(text):
+    """Count prompt tokens for AI_MODEL (chars/4 estimate without tiktoken)."""
+    if _ENC is None:
+        return len(text) // 4
+    return len(_ENC.encode(text, disallowed_special=()))
+
+
+def per_file_token_budget(file_count):
+    """Split PROMPT_TOKEN_BUDGET (minus the fixed prompt) evenly across files."""
+    prompt_tokens = count_tokens(REVIEW_INSTRUCTIONS) + count_tokens(build_review_prompt({}))
+    return max(1, (PROMPT_TOKEN_BUDGET - prompt_tokens) // file_count)
+
+
+def split_into_batches(files_content):
+    """
+    Split files into prompt batches.
+    
+    Files share a single request (one JSON reply keyed by path) unless it
+    would hold more than MAX_BATCH_FILES files or MAX_PROMPT_TOKENS tokens.
+    Then they are spread in order over the fewest batches the file cap
+    allows, and a batch is closed early whenever the next file would push
+    it past MAX_PROMPT_TOKENS. With REVIEW_PER_FILE=1 every file gets its
+    own batch instead. Multiple batches are reviewed concurrently (up to
+    AI_CONCURRENCY at once).
+    """
+    if REVIEW_PER_FILE and len(files_content) > 1:
+        return [{file_path: content} for file_path, content in files_content.items()]
+    
+    token_counts = {path: count_tokens(content) for path, content in files_content.items()}
+    total_tokens = sum(token_counts.values())
+    if len(files_content) <= MAX_BATCH_FILES and total_tokens <= MAX_PROMPT_TOKENS:
+        return [files_content]
+    
+    # Even file counts per batch, e.g. 9 files -> 5 + 4 rather than 8 + 1
+    batch_count = -(-len(files_content) // MAX_BATCH_FILES)
+    files_per_batch = -(-len(files_content) // batch_count)
+    batches = [{}]
+    batch_tokens = 0
+    for file_path, content in files_content.items():
+        if batches[-1] and (len(batches[-1]) >= files_per_batch
+                            or batch_tokens + token_counts[file_path] > MAX_PROMPT_TOKENS):
+            batches.append({})
+            batch_tokens = 0
+        batches[-1][file_path] = content
+        batch_tokens += token_counts[file_path]
+    
+    print(f"⚠️  {len(files_content)} files / ~{total_tokens} tokens, splitting into {len(batches)} batches")
+    return batches
+
+
+def build_review_prompt(files_content):
+    """Build the user message (the code under review) for one batch of files."""
+    # Collect the pieces and join once, so file contents are copied only once
+    parts = ["Code to review:\n\n"]
+    for index, (file_path, content) in enumerate(files_content.items()):
+        if index:
+            parts.append("\n\n")
+        parts += ("### File: ", file_path, "\n```\n", content, "\n```")
+    parts.append("\n\nProvide your code review:")
+    
+    return "".join(parts)
+
+
+def parse_file_reviews(review_text, files_content):
+    """
+    Parse the model's JSON reply into ({file_path: markdown_review}, parsed).
+    
+    If the model did not return a JSON object of markdown strings, falls back
+    to the raw reply keyed by the batch's file list with parsed=False. For a
+    one-file batch that key is the real path, so callers must not cache
+    fallback entries.
+    """
+    try:
+        reviews = json_loads(review_text)
+    except (TypeError, ValueError):  # JSONDecodeError from either parser is a ValueError
+        reviews = None
+    
+    if not isinstance(reviews, dict) or not reviews:
+        print("⚠️  AI reply was not a JSON object, using raw text")
+        return {", ".join(files_content): review_text or ""}, False
+    
+    if not all(isinstance(text, str) for text in reviews.values()):
+        print("⚠️  AI reply had non-text file reviews, using raw text")
+        return {", ".join(files_content): review_text}, False
+    
+    return reviews, True
+
+
+FILE_REVIEW_HEADER = "#### 📄 `{}`"
+IDENTICAL_FILE_NOTE = "_Identical to `{}`, see its review._"
+
+# The lines above as they appear in a rendered review, so quality checks
+# can look at the model's own text only
+_RENDERED_MARKUP_RE = re.compile(
+    r'^(?:#### 📄 `[^`\n]*`|_Identical to `[^`\n]*`, see its review\._)\n*', re.M
+)
+
+
+def render_file_reviews(reviews):
+    """Render per-file reviews as one markdown document."""
+    return "\n\n".join(
+        f"{FILE_REVIEW_HEADER.format(file_path)}\n\n{text}" for file_path, text in reviews.items()
+    )
+
+
+# A "path": "review" pair in a JSON reply, where the review may still be
+# streaming in (no closing quote yet)
+_PARTIAL_REVIEW_RE = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*"((?:[^"\\]|\\.)*)"?')
+
+
+def partial_file_reviews(partial_json):
+    """Extract {file_path: review_so_far} from a JSON reply that is still streaming."""
+    reviews = {}
+    for match in _PARTIAL_REVIEW_RE.finditer(partial_json):
+        key, value = match.groups()
+        # Drop a half-streamed escape (e.g. a lone backslash or partial \uXXXX)
+        for cut in range(min(len(value), 6) + 1):
+            try:
+                reviews[json_loads(f'"{key}"')] = json_loads(f'"{value[:len(value) - cut]}"')
+                break
+            except ValueError:
+                continue
+    return reviews
+
+
+def model_review_text(review_text):
+    """Strip the file headers and notes the agent adds, leaving the model's text."""
+    return _RENDERED_MARKUP_RE.sub('', review_text)
+
+
+def review_max_tokens(file_count):
+    """Output token cap for a batch: small batches finish sooner with a tighter cap."""
+    return max(AI_MIN_TOKENS, min(AI_MAX_TOKENS, AI_TOKENS_PER_FILE * file_count))
+
+
+def output_token_caps(file_count):
+    """Caps to try in order: the batch's own cap, then AI_MAX_TOKENS if a reply is cut off."""
+    return sorted({review_max_tokens(file_count), AI_MAX_TOKENS})
+
+
+def build_review_request(files_content, max_tokens=None):
+    """Build the chat.completions.create arguments for one batch."""
+    return {
+        'model': AI_MODEL,
+        'messages': [
+            {'role': 'system', 'content': REVIEW_INSTRUCTIONS},
+            {'role': 'user', 'content': build_review_prompt(files_content)}
+        ],
+        'temperature': AI_TEMPERATURE,
+        'max_tokens': max_tokens or review_max_tokens(len(files_content)),
+        'response_format': {'type': 'json_object'}
+    }
+
+
+def report_prompt_cache(usage):
+    """Print how many prompt tokens OpenAI served from its prefix cache."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', None) or 0
+    print(f"💾 Prompt cache: {cached_tokens}/{usage.prompt_tokens} input tokens cached")
+
+
+def collect_stream(stream, on_progress=None):
+    """
+    Accumulate a streamed completion into (reply_text, finish_reason).
+    
+    on_progress (if given) receives the text so far every
+    STREAM_UPDATE_EVERY chunks.
+    """
+    parts = []
+    finish_reason = None
+    for count, chunk in enumerate(stream, 1):
+        if chunk.choices:
+            if chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+        if on_progress and count % STREAM_UPDATE_EVERY == 0:
+            on_progress(''.join(parts))
+        if getattr(chunk, 'usage', None):  # Final chunk with stream_options include_usage
+            report_prompt_cache(chunk.usage)
+    return ''.join(parts), finish_reason
+
+
+async def create_completion_async(client, request):
+    """Call chat.completions.create on the async client, retrying rate limits and timeouts."""
+    for attempt in range(1, AI_MAX_ATTEMPTS + 1):
+        try:
+            return await client.chat.completions.create(**request)
+        except (RateLimitError, APITimeoutError) as e:
+            if attempt == AI_MAX_ATTEMPTS:
+                raise
+            delay = 2 ** attempt
+            print(f"⚠️  {type(e).__name__} (attempt {attempt}/{AI_MAX_ATTEMPTS}), retrying in {delay}s...")
+            await asyncio.sleep(delay)
+
+
+async def review_batch_async(client, semaphore, files_content):
+    """
+    Review one batch on the async client; returns parse_file_reviews' tuple.
+    
+    A reply cut off by the output cap is not valid JSON, so it is retried
+    once with AI_MAX_TOKENS and the review fails if it is still cut off.
+    """
+    async with semaphore:
+        for max_tokens in output_token_caps(len(files_content)):
+            response = await create_completion_async(client, build_review_request(files_content, max_tokens))
+            if response.usage:
+                report_prompt_cache(response.usage)
+            choice = response.choices[0]
+            if choice.finish_reason != 'length':
+                return parse_file_reviews(choice.message.content, files_content)
+            print(f"⚠️  AI reply was cut off at {max_tokens} tokens")
+        raise RuntimeError(f"AI reply exceeded {AI_MAX_TOKENS} output tokens")
+
+
+async def review_batches_async(batches):
+    """Review several batches concurrently; returns (reviews, unparsed_keys)."""
+    # Closed before asyncio.run() tears down the loop, so no pooled
+    # connection outlives it
+    async with httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE, limits=OPENAI_LIMITS, timeout=OPENAI_TIMEOUT
+    ) as http_client:
+        client = track_openai(AsyncOpenAI(api_key=OPENAI_KEY, http_client=http_client))
+        semaphore = asyncio.Semaphore(AI_CONCURRENCY)
+        
+        results = await asyncio.gather(
+            *(review_batch_async(client, semaphore, batch) for batch in batches)
+        )
+    
+    reviews, unparsed = {}, set()
+    for batch_reviews, parsed in results:
+        reviews.update(batch_reviews)
+        if not parsed:
+            unparsed.update(batch_reviews)
+    return reviews, unparsed
+
+
+def review_with_batch_api(batches):
+    """
+    Review batches through the OpenAI Batch API.
+    
+    Batch jobs are billed at 50% and use a separate rate-limit pool, but
+    complete asynchronously (24h window), so this blocks while polling.
+    One request line is written per prompt batch, not per file, so the
+    prompt is still shared across the files in each batch. Returns
+    (reviews, unparsed_keys) like review_batches_async.
+    """
+    client = get_openai_client()
+    
+    batch_path = os.path.join(tempfile.gettempdir(), 'batch.jsonl')
+    with open(batch_path, 'w', encoding='utf-8') as f:
+        for index, batch in enumerate(batches):
+            f.write(json.dumps({
+                'custom_id': f'batch-{index}',
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': build_review_request(batch, AI_MAX_TOKENS)  # No cheap retry if cut off
+            }) + "\n")
+    
+    with open(batch_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    
+    job = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h'
+    )
+    print(f"📦 Submitted batch {job.id} ({len(batches)} request(s))")
+    
+    # Poll with exponential backoff until the job reaches a final state
+    delay = BATCH_POLL_INTERVAL
+    while job.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        time.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX_INTERVAL)
+        job = client.batches.retrieve(job.id)
+        print(f"   ⏳ Batch status: {job.status}")
+    
+    if job.status != 'completed' or not job.output_file_id:
+        raise RuntimeError(f"Batch {job.id} ended with status '{job.status}'")
+    
+    # Output is NDJSON in arbitrary order - index results by batch first
+    results = {}
+    for line in client.files.content(job.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        result = json_loads(line)
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            print(f"⚠️  Batch request {result.get('custom_id')} failed: {result.get('error')}")
+            continue
+        results[int(result['custom_id'].split('-')[1])] = response['body']
+    
+    reviews, unparsed = {}, set()
+    for index, batch in enumerate(batches):
+        if index not in results:
+            continue
+        body = results[index]
+        usage = body.get('usage') or {}
+        track_usage(
+            model=body.get('model', AI_MODEL),
+            input_tokens=usage.get('prompt_tokens', 0),
+            output_tokens=usage.get('completion_tokens', 0),
+            metadata={'batch_api': True, 'batch_id': job.id}
+        )
+        if body['choices'][0].get('finish_reason') == 'length':
+            print(f"⚠️  Batch request batch-{index} was cut off at {AI_MAX_TOKENS} tokens, skipping it")
+            continue
+        batch_reviews, parsed = parse_file_reviews(body['choices'][0]['message']['content'], batch)
+        reviews.update(batch_reviews)
+        if not parsed:
+            unparsed.update(batch_reviews)
+    
+    if not reviews:
+        raise RuntimeError(f"Batch {job.id} returned no reviews")
+    
+    return reviews, unparsed
+
+
 def review_code_with_ai(files_content):
     """Send code to OpenAI for review."""
     print_step(2, "AI Code Review")
     
     try:
-        client = OpenAI(api_key=OPENAI_KEY)
-        client = track_openai(client)
+        print(f"🤖 Analyzing {len(files_content)} files with AI...")
         
-        # Build code content string
-        code_sections = []
+        # Files whose content was reviewed recently reuse that review
+        reviews, pending = {}, {}
         for file_path, content in files_content.items():
-            code_sections.append(f"### File: {file_path}\n```\n{content}\n```")
+            cached = None if FORCE_REVIEW else load_cached_response(file_review_cache_key(file_path, content))
+            if cached is None:
+                pending[file_path] = content
+            else:
+                reviews[file_path] = cached
         
-        all_code = "\n\n".join(code_sections)
+        if reviews:
+            print(f"♻️  Reusing cached reviews for {len(reviews)} unchanged files")
         
-        prompt = f"""You are a senior software engineer with 10 years experience reviewing Python code for production systems. Review these code files and provide constructive feedback.
-
-Focus on:
-1. 🐛 **Bugs & Logic Errors**: Null checks, edge cases, potential crashes
-2. 🔒 **Security Issues**: SQL injection, XSS, authentication, exposed secrets
-3. ⚡ **Performance**: Inefficient code, memory leaks, slow operations
-4. 📖 **Code Quality**: Readability, naming, complexity, best practices
-5. 🧪 **Testing Needs**: What should be tested, missing test cases
-6. 📚 **Documentation**: Unclear code, missing comments
-
-Format your response:
-- Start with overall assessment (✅ Looks good / ⚠️ Needs attention / 🔴 Critical issues)
-- Group findings by severity:
-  - 🔴 **Critical**: Must fix immediately (security, major bugs)
-  - 🟡 **Important**: Should fix (performance, quality issues)
-  - 🟢 **Suggestions**: Nice to have (style, minor improvements)
-- For each issue:
-  - Mention the file name
-  - Point out the specific problem
-  - Explain WHY it's an issue
-  - Suggest HOW to fix it with code example if helpful
-- End with positive feedback on what's done well
-- Be helpful and constructive, not just critical
-
-EXAMPLE GOOD REVIEW:
-        Code to review:
-
-{all_code}
-
-Provide your code review:"""
+        # Identical files (copies, vendored stubs) are sent once and share a review
+        first_path_by_content, duplicates = {}, {}
+        for file_path, content in pending.items():
+            first_path = first_path_by_content.setdefault(content, file_path)
+            if first_path != file_path:
+                duplicates[file_path] = first_path
         
-        print(f"🤖 Analyzing {len(files_content)} files with AI...")
+        if duplicates:
+            print(f"🪞 {len(duplicates)} files are identical to another changed file, sending them once")
+            pending = {path: content for path, content in pending.items() if path not in duplicates}
         
-        response = client.chat.completions.create(
-            model=AI_MODEL,
-            messages=[{'role': 'user', 'content': prompt}],
-            temperature=AI_TEMPERATURE,
-            max_tokens=AI_MAX_TOKENS
-        )
+        if pending:
+            batches = split_into_batches(pending)
+            print(f"🧩 Prompt prefix {REVIEW_INSTRUCTIONS_HASH} ({PROMPT_VERSION}), {len(batches)} request(s)")
+            
+            if USE_BATCH_API:
+                new_reviews, unparsed = review_with_batch_api(batches)
+            elif len(batches) == 1:
+                # Fast path: one blocking call, no event loop needed
+                client = get_openai_client()
+                
+                # Stream so partial output is available as soon as it's generated.
+                # A reply cut off by the cap is broken JSON: retry with the full
+                # cap, then fail rather than post the fragment.
+                with stream_progress_to_github() as on_progress:
+                    for max_tokens in output_token_caps(len(pending)):
+                        stream = client.chat.completions.create(
+                            **build_review_request(pending, max_tokens),
+                            stream=True,
+                            stream_options={'include_usage': True}
+                        )
+                        review_json, finish_reason = collect_stream(stream, on_progress=on_progress)
+                        if finish_reason != 'length':
+                            break
+                        print(f"⚠️  AI reply was cut off at {max_tokens} tokens")
+                    else:
+                        raise RuntimeError(f"AI reply exceeded {AI_MAX_TOKENS} output tokens")
+                new_reviews, parsed = parse_file_reviews(review_json, pending)
+                unparsed = set() if parsed else set(new_reviews)
+            else:
+                new_reviews, unparsed = asyncio.run(review_batches_async(batches))
+            
+            # Raw-text fallbacks (non-JSON replies) are shown once, never cached
+            for file_path, text in new_reviews.items():
+                if file_path in pending and file_path not in unparsed:
+                    save_cached_response(file_review_cache_key(file_path, pending[file_path]), text)
+            for file_path, first_path in duplicates.items():
+                if first_path in new_reviews:
+                    if first_path not in unparsed:
+                        save_cached_response(file_review_cache_key(file_path, files_content[file_path]), new_reviews[first_path])
+                    new_reviews[file_path] = IDENTICAL_FILE_NOTE.format(first_path)
+            reviews.update(new_reviews)
         
-        review_text = response.choices[0].message.content
+        # Render in the PR's file order, then anything the model keyed differently
+        ordered = {path: reviews.pop(path) for path in files_content if path in reviews}
+        ordered.update(reviews)
+        review_text = render_file_reviews(ordered)
         
         print("✅ AI review completed")
         print("\n" + "=" * 60)
@@ -166,32 +915,47 @@ Provide your code review:"""
         
     except Exception as e:
         print(f"❌ Error during AI review: {e}")
-        return f"⚠️ AI review failed: {e}\n\nPlease review manually."
+        return f"{REVIEW_FAILED_PREFIX}: {e}\n\nPlease review manually."
+
+
+# Review quality heuristics, all found in one scan (only the generic phrases
+# are case-insensitive, which replaces a full .lower() copy)
+_FLAG_RE = re.compile(
+    r'(?P<focus>Focus on)|(?P<bugs>Bugs & Logic Errors)|(?P<line>Line)'
+    r'|(?P<generic>(?i:looks good|well written|no issues found|consider refactoring))'
+)
+_ALL_FLAG_GROUPS = frozenset(_FLAG_RE.groupindex)
 
 
 def validate_ai_review(review_text):
     """Check if AI review is actually useful or just hallucinating."""
     
+    # Judge only what the model wrote - the file headers alone contain backticks
+    review_text = model_review_text(review_text)
+    
+    found = set()
+    for match in _FLAG_RE.finditer(review_text):
+        found.add(match.lastgroup)
+        if found == _ALL_FLAG_GROUPS:
+            break
+    
+    has_repeated_prompt = 'focus' in found and 'bugs' in found
+    has_generic_phrase = 'generic' in found
+    has_line_refs = 'line' in found
+    backtick_count = review_text.count('`')
+    
     red_flags = []
     
     # Check 1: Did it just repeat the prompt?
-    if "Focus on" in review_text and "Bugs & Logic Errors" in review_text:
+    if has_repeated_prompt:
         red_flags.append("AI might be repeating instructions")
     
-    # Check 2: Is it too generic?
-    generic_phrases = [
-        "looks good",
-        "well written",
-        "no issues found",
-        "consider refactoring"  # without specifics
-    ]
-    
-    if any(phrase in review_text.lower() for phrase in generic_phrases):
-        if "Line" not in review_text:  # No specific line numbers
-            red_flags.append("Review too generic - no specific issues cited")
+    # Check 2: Is it too generic? (no specific line numbers)
+    if has_generic_phrase and not has_line_refs:
+        red_flags.append("Review too generic - no specific issues cited")
     
     # Check 3: Did it reference actual code? (Simple check for code ticks)
-    if review_text.count('`') < 2:
+    if backtick_count < 2:
         red_flags.append("No code examples/references in review")
     
     # Check 4: Is it suspiciously short?
@@ -207,87 +971,289 @@ def validate_ai_review(review_text):
     return True, []
 
 
-def post_to_github(review_text, files_reviewed):
-    """Post review comment on GitHub PR."""
-    print_step(3, "Posting Review to GitHub")
+def fetch_review_comment_graphql():
+    """Look up the AI review comment via GraphQL, newest 100 comments per page."""
+    variables = {'owner': REPO_OWNER, 'name': REPO_NAME, 'number': int(PR_NUMBER), 'before': None}
+    while True:
+        response = _SESSION.post(
+            GITHUB_GRAPHQL_URL,
+            headers=GITHUB_HEADERS,
+            json={'query': FIND_REVIEW_COMMENT_QUERY, 'variables': variables},
+            timeout=HTTP_TIMEOUT
+        )
+        response.raise_for_status()
+        data = json_loads(response.content)
+        if data.get('errors'):
+            raise RuntimeError(data['errors'][0].get('message', 'GraphQL error'))
+        
+        comments = data['data']['repository']['pullRequest']['comments']
+        for comment in reversed(comments['nodes']):
+            if (comment.get('body') or '').startswith(REVIEW_COMMENT_HEADER):
+                return {'id': comment['databaseId'], 'body': comment['body']}
+        
+        # Not among these - page back through older comments
+        if not comments['pageInfo']['hasPreviousPage']:
+            return None
+        variables['before'] = comments['pageInfo']['startCursor']
+
+
+def fetch_review_comment():
+    """Return the existing AI review comment on the PR as {'id', 'body'}, or None."""
+    try:
+        return fetch_review_comment_graphql()
+    except Exception as e:
+        # Token without GraphQL access - scan the REST comment list instead
+        print(f"⚠️  GraphQL lookup failed ({e}), falling back to REST")
     
-    if not PR_NUMBER:
-        print("⚠️  Not a pull request, skipping GitHub comment")
-        return
+    # Walk the pages (Link: rel="next") until the review comment turns up
+    url = f"{GITHUB_API_URL}/issues/{PR_NUMBER}/comments?per_page=100"
+    while url:
+        response = _SESSION.get(url, headers=GITHUB_HEADERS, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        
+        for comment in json_loads(response.content):
+            if (comment.get('body') or '').startswith(REVIEW_COMMENT_HEADER):
+                return comment
+        url = response.links.get('next', {}).get('url')
+    return None
+
+
+def find_review_comment():
+    """Return the ID of the existing AI review comment on the PR, or None."""
+    comment = fetch_review_comment()
+    return comment['id'] if comment else None
+
+
+def last_reviewed_sha():
+    """Return the HEAD SHA recorded in the PR's review comment, or None."""
+    comment_id = load_cached_comment_id()
+    if comment_id:
+        response = _SESSION.get(
+            f"{GITHUB_API_URL}/issues/comments/{comment_id}",
+            headers=GITHUB_HEADERS,
+            timeout=HTTP_TIMEOUT
+        )
+        comment = json_loads(response.content) if response.ok else None
+    else:
+        comment = fetch_review_comment()
     
+    match = REVIEWED_SHA_RE.search(comment.get('body') or '') if comment else None
+    return match.group(1) if match else None
+
+
+def load_cached_comment_id():
+    """Return the review comment ID saved by a previous run on this PR, or None."""
     try:
-        # Create file list
-        files_list = "\n".join([f"- `{f}`" for f in files_reviewed])
-        
-        # Create comment body
-        comment_body = f"""## 🤖 AI Code Review
+        with open(os.path.join(REVIEW_CACHE_DIR, f"comment-{PR_NUMBER}.json"), 'rb') as f:
+            return json_loads(f.read()).get('id')
+    except (OSError, ValueError):
+        return None
+
 
-### 📊 Files Reviewed
-{files_list}
+def save_comment_id(comment_id):
+    """Remember the review comment ID for later runs and expose it as a step output."""
+    try:
+        os.makedirs(REVIEW_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(REVIEW_CACHE_DIR, f"comment-{PR_NUMBER}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'id': comment_id}, f)
+    except OSError as e:
+        print(f"⚠️  Could not cache comment ID: {e}")
+    
+    if os.getenv('GITHUB_OUTPUT'):
+        with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
+            f.write(f"review_comment_id={comment_id}\n")
 
-**Total files:** {len(files_reviewed)}
 
----
+def upsert_review_comment(comment_body, comment_id=None):
+    """Update comment_id with comment_body, or create a new comment. Returns the comment ID."""
+    if comment_id:
+        response = _SESSION.patch(
+            f"{GITHUB_API_URL}/issues/comments/{comment_id}",
+            headers=GITHUB_HEADERS,
+            json={'body': comment_body},
+            timeout=HTTP_TIMEOUT
+        )
+    else:
+        response = _SESSION.post(
+            f"{GITHUB_API_URL}/issues/{PR_NUMBER}/comments",
+            headers=GITHUB_HEADERS,
+            json={'body': comment_body},
+            timeout=HTTP_TIMEOUT
+        )
+    response.raise_for_status()
+    return response.json()['id']
 
-### 🔍 AI Analysis
 
-{review_text}
+@contextmanager
+def stream_progress_to_github():
+    """
+    Yield a callback that shows the partial review in a PR progress comment.
+    
+    The progress goes in its own comment, so the previous complete review
+    (and its SHA marker) stays intact until the new one is posted. The
+    comment is deleted on exit. Only enabled with STREAM_REVIEW=1 on a PR;
+    yields None otherwise so the review simply streams silently.
+    """
+    if not (STREAM_REVIEW and PR_NUMBER):
+        yield None
+        return
+    
+    comment_id = None
+    
+    def update(partial_json):
+        nonlocal comment_id
+        body = f"{PROGRESS_COMMENT_HEADER}\n\n{render_file_reviews(partial_file_reviews(partial_json))}"
+        try:
+            comment_id = upsert_review_comment(body, comment_id)
+        except Exception as e:
+            print(f"⚠️  Could not update streaming comment: {e}")
+    
+    try:
+        yield update
+    finally:
+        if comment_id:
+            try:
+                _SESSION.delete(
+                    f"{GITHUB_API_URL}/issues/comments/{comment_id}",
+                    headers=GITHUB_HEADERS,
+                    timeout=HTTP_TIMEOUT
+                ).raise_for_status()
+            except Exception as e:
+                print(f"⚠️  Could not delete streaming comment: {e}")
 
----
 
-### 💡 About This Review
-This review analyzed the actual code in your changed files (not just the diff). The AI checked for bugs, security issues, performance problems, and code quality.
+def publish_review_comment(comment_body):
+    """Create or update the AI review comment (cached ID first, then scan)."""
+    comment_id = load_cached_comment_id()
+    if comment_id:
+        print(f"📌 Using cached review comment #{comment_id}")
+    else:
+        print("🔍 Checking for existing review...")
+        comment_id = find_review_comment()
+    
+    if comment_id:
+        print(f"📝 Updating existing review comment")
+    else:
+        print("📝 Creating new review comment")
+    
+    try:
+        new_comment_id = upsert_review_comment(comment_body, comment_id)
+    except requests.HTTPError as e:
+        # Cached comment was deleted - fall back to a scan (or a new comment)
+        if e.response is None or e.response.status_code != 404:
+            raise
+        print("⚠️  Cached review comment no longer exists, searching again")
+        new_comment_id = upsert_review_comment(comment_body, find_review_comment())
+    
+    save_comment_id(new_comment_id)
+    print("✅ Updated review comment" if new_comment_id == comment_id else "✅ Posted review comment")
 
-**Helpful?** React with 👍 or 👎
 
----
-*🤖 Automated by AI PR Review Agent | [View workflow]({GITHUB_RUN_URL})*"""
-        
-        # GitHub API setup
-        api_url = f"https://api.github.com/repos/{REPO_OWNER}/{REPO_NAME}"
-        headers = {
-            'Authorization': f'token {GITHUB_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
+def post_to_github(review_text, files_reviewed, head_sha=None, diff_only=False):
+    """
+    Post review comment on GitHub PR (marked as reviewing head_sha, if given).
+    
+    diff_only says the model saw function-context diffs (REVIEW_DIFF=1)
+    rather than whole files, and is reflected in the "About" note.
+    """
+    print_step(3, "Posting Review to GitHub")
+    
+    if not PR_NUMBER:
+        print("⚠️  Not a pull request, skipping GitHub comment")
+        return
+    
+    if diff_only:
+        scope = "This review analyzed the changed functions in your files (the diff with whole-function context), not the rest of each file."
+    else:
+        scope = "This review analyzed the actual code in your changed files (not just the diff)."
+    
+    try:
+        # Build the body from segments joined once (no template re-interpolation)
+        parts = [
+            "## 🤖 AI Code Review",
+            "",
+            "### 📊 Files Reviewed",
+            "\n".join(f"- `{f}`" for f in files_reviewed),
+            "",
+            f"**Total files:** {len(files_reviewed)}",
+            "",
+            "---",
+            "",
+            "### 🔍 AI Analysis",
+            "",
+            review_text,
+            "",
+            "---",
+            "",
+            "### 💡 About This Review",
+            f"{scope} The AI checked for bugs, security issues, performance problems, and code quality.",
+            "",
+            "**Helpful?** React with 👍 or 👎",
+            "",
+            "---",
+            f"*🤖 Automated by AI PR Review Agent | [View workflow]({GITHUB_RUN_URL})*",
+        ]
+        if head_sha:
+            parts.append(REVIEWED_SHA_MARKER.format(head_sha))
+        comment_body = "\n".join(parts)
         
-        # Check for existing review comment
-        print("🔍 Checking for existing review...")
-        comments_url = f"{api_url}/issues/{PR_NUMBER}/comments"
-        response = requests.get(comments_url, headers=headers)
-        response.raise_for_status()
+        publish_review_comment(comment_body)
         
-        existing_comment = None
-        for comment in response.json():
-            if '🤖 AI Code Review' in comment.get('body', ''):
-                existing_comment = comment
-                break
+        print(f"🔗 View: https://github.com/{REPO_OWNER}/{REPO_NAME}/pull/{PR_NUMBER}")
         
-        if existing_comment:
-            # Update existing comment
-            print(f"📝 Updating existing review comment")
-            update_url = f"{api_url}/issues/comments/{existing_comment['id']}"
-            response = requests.patch(
-                update_url,
-                headers=headers,
-                json={'body': comment_body}
-            )
-            response.raise_for_status()
-            print("✅ Updated review comment")
+    except Exception as e:
+        print(f"❌ Error posting to GitHub: {e}")
+
+
+def post_skip_notice(reason):
+    """Post a one-line review comment when the AI review is skipped."""
+    print_step(3, "Posting Skip Notice to GitHub")
+    
+    if not PR_NUMBER:
+        print("⚠️  Not a pull request, skipping GitHub comment")
+        return
+    
+    try:
+        publish_review_comment(
+            f"## 🤖 AI Code Review\n\n⏭️ {reason} - AI review skipped.\n\n"
+            f"---\n*🤖 Automated by AI PR Review Agent | [View workflow]({GITHUB_RUN_URL})*"
+        )
+    except Exception as e:
+        print(f"❌ Error posting to GitHub: {e}")
+
+
+def post_to_slack(review_text, is_valid, red_flags):
+    """Send a truncated copy of the review to Slack."""
+    if not SLACK_WEBHOOK:
+        print("ℹ️  SLACK_WEBHOOK not configured, skipping Slack notification")
+        return
+    
+    print("📨 Sending to Slack...")
+    try:
+        # Truncate for Slack to avoid massive messages; the full review is on the PR
+        parts = [f"🤖 *AI PR Review Complete* for <{GITHUB_RUN_URL}|#{PR_NUMBER}>"]
+        if not is_valid:
+            parts.append(f"⚠️ *Quality Warning:* {', '.join(red_flags)}")
+        if len(review_text) > SLACK_PREVIEW_CHARS:
+            pr_url = f"https://github.com/{REPO_OWNER}/{REPO_NAME}/pull/{PR_NUMBER}"
+            parts.append(f"{review_text[:SLACK_PREVIEW_CHARS]}...\n<{pr_url}|Read the full review>")
         else:
-            # Create new comment
-            print("📝 Creating new review comment")
-            response = requests.post(
-                comments_url,
-                headers=headers,
-                json={'body': comment_body}
-            )
-            response.raise_for_status()
-            print("✅ Posted review comment")
+            parts.append(review_text)
+        slack_text = "\n\n".join(parts)
         
-        print(f"🔗 View: https://github.com/{REPO_OWNER}/{REPO_NAME}/pull/{PR_NUMBER}")
+        response = _SESSION.post(
+            SLACK_WEBHOOK,
+            json={'text': slack_text},
+            timeout=SLACK_TIMEOUT
+        )
         
+        if response.status_code == 200:
+            print("✅ Report sent to Slack!")
+        else:
+            print(f"⚠️  Slack returned: {response.status_code}")
+    
     except Exception as e:
-        print(f"❌ Error posting to GitHub: {e}")
+        print(f"⚠️  Failed to send to Slack: {e}")
 
 
 def main():
@@ -310,8 +1276,38 @@ def main():
     print(f"   Repo: {REPO_OWNER}/{REPO_NAME}")
     print(f"   Model: {AI_MODEL}")
     
-    # 2. Get changed files
-    changed_files = get_changed_files()
+    # 2. Get changed files, looking up the last reviewed SHA on GitHub
+    # while git fetches the base branch
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        previous_review = None
+        if PR_NUMBER and not FORCE_REVIEW:
+            previous_review = executor.submit(last_reviewed_sha)
+        pr_diff = get_changed_files()
+        
+        # Re-triggered run on an already reviewed HEAD - keep the existing review
+        if previous_review:
+            try:
+                head_sha = pr_diff["head_sha"] or _git('rev-parse', 'HEAD').strip()
+                if previous_review.result() == head_sha:
+                    print(f"\n♻️  {head_sha[:7]} was already reviewed, skipping (set FORCE_REVIEW=1 to re-run)")
+                    if os.getenv('GITHUB_OUTPUT'):
+                        with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
+                            f.write("skipped=true\n")
+                    sys.exit(0)
+            except Exception as e:
+                print(f"⚠️  Could not check previous review: {e}")
+    
+    changed_files = pr_diff["changed_files"]
+    
+    if pr_diff["docs_only"]:
+        print("\n📝 Only documentation/lockfiles changed")
+        post_skip_notice("Documentation-only change")
+        sys.exit(0)
+    
+    if pr_diff["whitespace_only"]:
+        print("\nℹ️  Code changes are whitespace-only")
+        post_skip_notice("Whitespace-only change")
+        sys.exit(0)
     
     if not changed_files:
         print("\n⚠️  No code files to review")
@@ -319,13 +1315,24 @@ def main():
     
     # 3. Read file contents
     print_step(2, "Reading File Contents")
-    files_content = {}
+    token_budget = per_file_token_budget(len(changed_files))
+    source = f"diffs of {len(changed_files)} files" if REVIEW_DIFF else f"{len(changed_files)} files"
+    print(f"📖 Reading {source} (up to {token_budget} tokens each)...")
     
-    for file_path in changed_files:
-        print(f"📖 Reading {file_path}...")
-        content = read_file_content(file_path)
-        if content:
-            files_content[file_path] = content
+    # Reads are pure I/O with no shared state, so overlap them
+    with ThreadPoolExecutor(max_workers=min(10, len(changed_files))) as executor:
+        if REVIEW_DIFF:
+            contents = executor.map(
+                read_file_diff, changed_files,
+                repeat(pr_diff["base_sha"]), repeat(pr_diff["head_sha"]), repeat(token_budget)
+            )
+        else:
+            contents = executor.map(read_file_content, changed_files, repeat(token_budget))
+        files_content = {
+            file_path: content
+            for file_path, content in zip(changed_files, contents)
+            if content
+        }
     
     if not files_content:
         print("\n⚠️  Could not read any files")
@@ -333,12 +1340,29 @@ def main():
     
     print(f"✅ Successfully read {len(files_content)} files")
     
-    # 4. Review with AI
-    review = review_code_with_ai(files_content)
+    # 4. Review with AI (or reuse the review of these exact commits)
+    cache_key = None
+    if pr_diff["base_sha"] and pr_diff["head_sha"]:
+        cache_key = review_cache_key(pr_diff["base_sha"], pr_diff["head_sha"])
+    
+    review = load_cached_review(cache_key) if cache_key and not FORCE_REVIEW else None
+    
+    if review:
+        print(f"♻️  Reusing cached review for {pr_diff['head_sha'][:7]} (skipping AI call)")
+        print("\n" + "=" * 60)
+        print(review)
+        print("=" * 60)
+    else:
+        review = review_code_with_ai(files_content)
+        if cache_key and review and not review.startswith(REVIEW_FAILED_PREFIX):
+            save_cached_review(cache_key, review)
     
     if not review:
         print("\n❌ Failed to generate review")
         sys.exit(1)
+    
+    # Only a successful review marks HEAD as reviewed
+    reviewed_sha = None if review.startswith(REVIEW_FAILED_PREFIX) else pr_diff["head_sha"]
 
     # 5. Validate Review Quality
     print("🔍 Validating review quality...")
@@ -349,35 +1373,12 @@ def main():
         warning_msg = "\n\n> ⚠️ **AI Warning:** This review may be generic or incomplete.\n> **Flags:** " + ", ".join(red_flags) + "\n\n"
         review = warning_msg + review
     
-    # 6. Post to GitHub
-    post_to_github(review, list(files_content.keys()))
-    
-    # 7. Post to Slack
-    if SLACK_WEBHOOK:
-        print("📨 Sending to Slack...")
-        try:
-            # Truncate for Slack to avoid massive messages
-            slack_text = f"🤖 *AI PR Review Complete* for <{GITHUB_RUN_URL}|#{PR_NUMBER}>\n\n"
-            if not is_valid:
-                slack_text += f"⚠️ *Quality Warning:* {', '.join(red_flags)}\n\n"
-            
-            slack_text += review[:500] + "..." if len(review) > 500 else review
-            
-            response = requests.post(
-                SLACK_WEBHOOK,
-                json={'text': slack_text},
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                print("✅ Report sent to Slack!")
-            else:
-                print(f"⚠️  Slack returned: {response.status_code}")
-                
-        except Exception as e:
-            print(f"⚠️  Failed to send to Slack: {e}")
-    else:
-        print("ℹ️  SLACK_WEBHOOK not configured, skipping Slack notification")
+    # 6. Post to GitHub and Slack (different hosts, so in parallel)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        github_post = executor.submit(post_to_github, review, list(files_content.keys()), reviewed_sha, REVIEW_DIFF)
+        slack_post = executor.submit(post_to_slack, review, is_valid, red_flags)
+        for future in (github_post, slack_post):
+            future.result()
     
     print("\n" + "=" * 60)
     print("✅ PR review complete!")
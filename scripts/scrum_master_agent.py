@@ -9,7 +9,7 @@ import os
 import git
 import requests
 from openai import OpenAI
-from datetime import datetime, timedelta
+from datetime import datetime
 from auto_tracker import track_openai  # Auto-tracking import
 
 def main():
@@ -24,16 +24,14 @@ def main():
     
     try:
         repo = git.Repo('.')
-        cutoff = datetime.now() - timedelta(hours=24)
-        commits = [
-            c for c in repo.iter_commits() 
-            if datetime.fromtimestamp(c.committed_date) > cutoff
-        ]
+        # Let git stop at the cutoff instead of walking the whole history
+        log = repo.git.log('--since=24.hours.ago', '--pretty=format:%s%x1f%an')
+        commits = [line.split('\x1f', 1) for line in log.splitlines() if line]
         
         if commits:
             log_text = '\n'.join([
-                f'- {c.summary} (by {c.author.name})' 
-                for c in commits
+                f'- {summary} (by {author})' 
+                for summary, author in commits
             ])
             print(f"✅ Found {len(commits)} commits in last 24 hours")
         else:
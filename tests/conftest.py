@@ -0,0 +1,22 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    """Run async tests on asyncio (anyio's pytest plugin)."""
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def aclient(anyio_backend):
+    """Single AsyncClient calling the app in-process for the whole session."""
+    # Imported here so unit-only runs never load the app or httpx
+    import httpx
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
@@ -0,0 +1,154 @@
+"""Unit tests for the PR review agent script."""
+
+import ast
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+import pr_review_agent as agent  # noqa: E402
+
+
+def test_strip_python_comments_trailing_and_full_line():
+    """Test trailing and full-line comments are dropped, code is kept."""
+    source = "x = 1  # set x\n# explain y\n\n\ny = 2\n"
+    assert agent.strip_python_comments(source) == "x = 1\n\ny = 2\n"
+
+
+def test_strip_python_comments_keeps_hash_in_strings():
+    """Test a # inside a string literal is not treated as a comment."""
+    source = "url = 'http://host/#anchor'  # link\n"
+    assert agent.strip_python_comments(source) == "url = 'http://host/#anchor'\n"
+
+
+def test_strip_python_comments_triple_quoted_strings():
+    """Test blank lines and # lines inside triple-quoted strings survive."""
+    source = (
+        'def f():\n'
+        '    """Summary.\n'
+        '\n'
+        '\n'
+        '    # not a comment\n'
+        '    """\n'
+        '\n'
+        '\n'
+        '    return """a\n'
+        '\n'
+        '\n'
+        'b"""\n'
+    )
+    expected = source.replace('    """\n\n\n', '    """\n\n')
+    assert agent.strip_python_comments(source) == expected
+
+
+@pytest.mark.parametrize("source", [
+    's = """unterminated\n\n# still in the string\n',
+    "x = (1,\n# open bracket\n",
+])
+def test_strip_python_comments_untokenizable_unchanged(source):
+    """Test source that fails to tokenize (e.g. truncated) is returned as is."""
+    assert agent.strip_python_comments(source) == source
+
+
+@pytest.mark.parametrize("source", [
+    "import os  # os\n\n\n\nprint(os.sep)\n",
+    'x = f"{1}#{2}"  # fmt\ny = r"\\#"\n',
+    'class A:\n    """Doc.\n\n\n    More."""\n\n\n\n    # gap\n    b = 1\n',
+])
+def test_strip_python_comments_same_ast(source):
+    """Test stripping never changes what the code does."""
+    stripped = agent.strip_python_comments(source)
+    assert ast.dump(ast.parse(stripped)) == ast.dump(ast.parse(source))
+
+
+def git(cwd, *args):
+    """Run a git command in cwd."""
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def pr_checkout(tmp_path, monkeypatch):
+    """A clone whose HEAD is a PR branch off origin/main; yields a commit helper."""
+    for var in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(f"{var}_NAME", "Test")
+        monkeypatch.setenv(f"{var}_EMAIL", "test@example.com")
+
+    origin = tmp_path / "origin"
+    origin.mkdir()
+    git(origin, "init", "-q", "-b", "main")
+    (origin / "kept.py").write_text("def f():\n    return 1\n")
+    (origin / "removed.py").write_text("x = 1\n")
+    (origin / "style.js").write_text("function f() {\n  return 1;\n}\n")
+    (origin / "nested.py").write_text("if True:\n    x = 1\ny = 2\n")
+    git(origin, "add", ".")
+    git(origin, "commit", "-q", "-m", "base")
+
+    work = tmp_path / "work"
+    git(tmp_path, "clone", "-q", str(origin), str(work))
+    git(work, "checkout", "-q", "-b", "feature")
+    monkeypatch.chdir(work)
+    monkeypatch.setattr(agent, "BASE_REF", "main")
+
+    def commit(files=(), removed=()):
+        for path, content in dict(files).items():
+            mode = "wb" if isinstance(content, bytes) else "w"
+            with open(work / path, mode) as f:
+                f.write(content)
+        for path in removed:
+            git(work, "rm", "-q", path)
+        git(work, "add", "-A")
+        git(work, "commit", "-q", "-m", "change")
+
+    yield commit
+
+
+def test_get_changed_files_added_modified_deleted(pr_checkout):
+    """Test added and modified code files are listed, deleted ones are not."""
+    pr_checkout(
+        {"added.py": "y = 2\n", "kept.py": "def f():\n    return 2\n"},
+        removed=["removed.py"],
+    )
+    result = agent.get_changed_files()
+    assert sorted(result["changed_files"]) == ["added.py", "kept.py"]
+    assert (result["additions"], result["deletions"]) == (2, 2)
+    assert result["base_sha"] and result["head_sha"]
+    assert not result["docs_only"] and not result["whitespace_only"]
+
+
+def test_get_changed_files_binary_not_counted(pr_checkout):
+    """Test a binary file adds no line stats and is not reviewed."""
+    pr_checkout({"logo.bin": b"\x00\x01\x02\xff" * 64, "kept.py": "def f():\n    return 2\n"})
+    result = agent.get_changed_files()
+    assert result["changed_files"] == ["kept.py"]
+    assert (result["additions"], result["deletions"]) == (1, 1)
+
+
+@pytest.mark.parametrize("files, docs_only", [
+    ({"README.md": "# Title\n", "NOTES.TXT": "notes\n"}, True),
+    ({"package-lock.json": "{}\n", "go.sum": "x v1\n", "yarn.lock": "x\n"}, True),
+    ({"config.json": "{}\n"}, False),
+    ({"ergo.sum": "x\n"}, False),
+])
+def test_get_changed_files_docs_only(pr_checkout, files, docs_only):
+    """Test only docs, assets and lockfiles count as a docs-only PR."""
+    pr_checkout(files)
+    assert agent.get_changed_files()["docs_only"] is docs_only
+
+
+def test_get_changed_files_whitespace_only_js(pr_checkout):
+    """Test a re-indented .js file is skipped as whitespace-only."""
+    pr_checkout({"style.js": "function f() {\n\treturn 1; \n\n}\n"})
+    result = agent.get_changed_files()
+    assert result["whitespace_only"]
+    assert result["changed_files"] == []
+
+
+def test_get_changed_files_reindented_python_reviewed(pr_checkout):
+    """Test re-indenting Python is reviewed (it changes the code) but trailing spaces are not."""
+    pr_checkout({"nested.py": "if True:\n    x = 1\n    y = 2\n", "kept.py": "def f():   \n    return 1\n"})
+    result = agent.get_changed_files()
+    assert result["changed_files"] == ["nested.py"]
+    assert not result["whitespace_only"]